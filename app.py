@@ -1,117 +1,283 @@
 import streamlit as st
 import openai
 import pdfplumber
+import pypdfium2 as pdfium
 import docx
+from docx.oxml import parse_xml
 from io import BytesIO
+from xml.sax.saxutils import escape
 import json
+import asyncio
 
 # --- CONFIGURATION ---
 st.set_page_config(page_title="AI Resume Architect", layout="wide")
 
 # --- HELPER FUNCTIONS: TEXT EXTRACTION ---
 
-def extract_text_from_pdf(file):
-    text = ""
-    with pdfplumber.open(file) as pdf:
-        for page in pdf.pages:
-            text += page.extract_text() or ""
-    return text
+def extract_text_from_pdf(data):
+    try:
+        # pdfium (C-backed) is several times faster than pdfplumber for
+        # plain text extraction, which is all we need here. It emits \r\n
+        # line endings; normalize them so downstream paragraph splitting
+        # (smart_trim splits on "\n\n") sees real blank lines.
+        pdf = pdfium.PdfDocument(data)
+        try:
+            text = "\n".join(page.get_textpage().get_text_range() for page in pdf)
+            return text.replace("\r\n", "\n")
+        finally:
+            pdf.close()
+    except Exception:
+        # Fallback for PDFs that pdfium fails to parse. Kept serial:
+        # pdfminer isn't thread-safe on a shared document, and this path
+        # only runs on the rare pdfium failure anyway.
+        with pdfplumber.open(BytesIO(data)) as pdf:
+            texts = [page.extract_text() or "" for page in pdf.pages]
+        return "\n".join(texts)
 
-def extract_text_from_docx(file):
-    doc = docx.Document(file)
+def extract_text_from_docx(data):
+    doc = docx.Document(BytesIO(data))
     return "\n".join([para.text for para in doc.paragraphs])
 
+@st.cache_data(show_spinner=False)
+def extract_text(name, data):
+    """
+    Extracts text from an uploaded resume, cached by (filename, bytes) so
+    Streamlit reruns (e.g. download clicks) don't re-parse the same file.
+    """
+    if name.endswith(".pdf"):
+        return extract_text_from_pdf(data)
+    return extract_text_from_docx(data)
+
+_W_NS = 'xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"'
+
 def create_docx(text):
     doc = docx.Document()
-    for line in text.split('\n'):
-        doc.add_paragraph(line)
+    # Build every paragraph as one XML string and parse it in a single
+    # pass; add_paragraph per line pays a style lookup and element append
+    # for each of the ~200 lines in a typical resume.
+    paragraphs_xml = "".join(
+        f'<w:p><w:r><w:t xml:space="preserve">{escape(line)}</w:t></w:r></w:p>'
+        for line in text.split('\n')
+    )
+    container = parse_xml(f'<w:body {_W_NS}>{paragraphs_xml}</w:body>')
+    body = doc.element.body
+    for p in list(container):
+        body.insert(len(body) - 1, p)  # keep sectPr as the last element
     buffer = BytesIO()
     doc.save(buffer)
     buffer.seek(0)
     return buffer
 
-# --- AI LOGIC ---
+@st.cache_data(show_spinner=False)
+def create_docx_cached(text):
+    """
+    Memoized DOCX bytes per text, so download-button reruns don't rebuild
+    an unchanged document.
+    """
+    return create_docx(text).getvalue()
 
-def analyze_resume(client, resume_text, jd_text, model="gpt-4o"):
+def smart_trim(text, max_chars):
     """
-    Analyzes the resume against the JD and returns a JSON object 
-    with a match score and improvement tips.
+    Caps text at max_chars, cutting on paragraph boundaries and keeping
+    paragraphs from the start and the end (summary and most recent
+    sections) rather than blindly slicing mid-sentence.
     """
-    prompt = f"""
-    Act as a strict ATS (Applicant Tracking System). 
-    Compare the Resume against the Job Description.
-
-    CRITERIA FOR SCORING:
-    1. Exact Keyword Matching (Do the skills in JD appear in Resume?)
-    2. Job Title Relevance
-    3. Measurable Results (Numbers/%)
-    
-    TASK:
-    Return a JSON object with:
-    - "match_score": A number between 0-100.
-    - "tips": An array of 3 strings indicating missing keywords or weak areas.
+    if len(text) <= max_chars:
+        return text
+
+    paragraphs = [p for p in text.split('\n\n') if p.strip()]
+
+    head, used = [], 0
+    head_budget = int(max_chars * 0.75)
+    for idx, para in enumerate(paragraphs):
+        if used + len(para) + 2 > head_budget:
+            break
+        head.append(para)
+        used += len(para) + 2
+    else:
+        # Every paragraph fit in the head budget; mark that so the tail
+        # loop can't re-append paragraphs already kept.
+        idx = len(paragraphs)
+
+    tail = []
+    for para in reversed(paragraphs[idx:]):
+        if used + len(para) + 2 > max_chars:
+            break
+        tail.insert(0, para)
+        used += len(para) + 2
+
+    if not head and not tail:
+        return text[:max_chars]
+
+    if len(head) + len(tail) < len(paragraphs):
+        return "\n\n".join(head + ["[...]"] + tail)
+    return "\n\n".join(head + tail)
+
+# --- AI LOGIC ---
+
+# Scoring is a narrow classification task that doesn't need the main
+# generation model; mini is far cheaper and roughly twice as fast.
+SCORING_MODEL = "gpt-4o-mini"
+
+# Static instruction blocks live in the system message, identical across
+# calls, so the API's automatic prompt caching can reuse the shared prefix;
+# only the changing RESUME/JD text goes in the user message.
+
+ATS_SYSTEM_PROMPT = """You are a strict ATS (Applicant Tracking System) algorithm. Output valid JSON only.
+
+Compare BOTH resumes provided by the user against the same Job Description.
+
+CRITERIA FOR SCORING:
+1. Exact Keyword Matching (Do the skills in JD appear in Resume?)
+2. Job Title Relevance
+3. Measurable Results (Numbers/%)
+
+TASK:
+Return a JSON object with:
+- "a": {"match_score": 0-100, "tips": [3 strings on missing keywords or weak areas in RESUME_A]}
+- "b": {"match_score": 0-100}"""
+
+# Server-side validated schema for the scoring call: the API guarantees
+# the shape, so a malformed-JSON retry path is unnecessary.
+ATS_SCORES_SCHEMA = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "AtsScores",
+        "schema": {
+            "type": "object",
+            "properties": {
+                "a": {
+                    "type": "object",
+                    "properties": {
+                        "match_score": {"type": "integer", "minimum": 0, "maximum": 100},
+                        "tips": {"type": "array", "items": {"type": "string"}}
+                    },
+                    "required": ["match_score", "tips"],
+                    "additionalProperties": False
+                },
+                "b": {
+                    "type": "object",
+                    "properties": {
+                        "match_score": {"type": "integer", "minimum": 0, "maximum": 100}
+                    },
+                    "required": ["match_score"],
+                    "additionalProperties": False
+                }
+            },
+            "required": ["a", "b"],
+            "additionalProperties": False
+        },
+        "strict": True
+    }
+}
+
+OPTIMIZE_SYSTEM_PROMPT = """You are an expert Resume Writer specializing in beating ATS algorithms.
+Your goal is to rewrite the provided resume to get a 95% match score against the Job Description.
+
+INSTRUCTIONS:
+1. **Keyword Mirroring**: Identify hard skills and keywords in the JD. Use the EXACT SAME PHRASING in the resume.
+2. **Summary**: Rewrite the Professional Summary to be a 3-sentence pitch directly addressing the JD's top requirements.
+3. **Experience**: Keep the user's actual companies and dates. Rewrite the bullet points to emphasize results using keywords from the JD.
+4. **Skills Section**: Create a dedicated "Technical Skills" or "Core Competencies" section. Fill it with matching skills from the JD that the candidate possesses.
+5. **Honesty**: Do not invent jobs. If a skill is strictly missing, do not lie, but emphasize adjacent skills.
+6. **Note**: Long inputs are trimmed; a "[...]" marker means omitted sections. Do not invent content for them.
+
+FORMAT:
+Clean text format suitable for copy-pasting into Word. No markdown bolding (**), just plain text with bullet points (-)."""
+
+COVER_SYSTEM_PROMPT = """Write a compelling cover letter for the job provided by the user.
 
-    RESUME: {resume_text[:3000]}
-    JD: {jd_text[:1500]}
+GUIDELINES:
+1. Tone: Enthusiastic, Professional, Direct.
+2. Hook: Start with why the candidate fits the specific role title in the JD.
+3. Body: Highlight 3 key achievements from the resume that solve problems listed in the JD.
+4. Call to Action: Request an interview.
+5. Note: Long inputs are trimmed; a "[...]" marker means omitted sections. Do not invent content for them."""
+
+def make_async_client(api_key):
+    # One client per pipeline run: its connection pool is shared by the
+    # concurrent calls within that run, which is where reuse pays off.
+    # Caching it across reruns is unsafe — each asyncio.run uses a fresh
+    # event loop, and a pooled keep-alive connection bound to an earlier
+    # (closed) loop raises "Event loop is closed" when reused.
+    # max_retries applies the SDK's built-in exponential backoff to rate
+    # limits and transient failures.
+    return openai.AsyncOpenAI(api_key=api_key, max_retries=5, timeout=30.0)
+
+async def analyze_two_resumes(client, original_text, optimized_text, jd_text):
     """
-    
-    response = client.chat.completions.create(
-        model=model,
+    Scores the original and optimized resumes against the JD in a single
+    call (shares the JD tokens and saves one round trip). Returns a JSON
+    object with "a" (original) and "b" (optimized) score entries.
+    """
+    user_content = f"RESUME_A:\n{original_text[:3000]}\n\nRESUME_B:\n{optimized_text[:3000]}\n\nJD:\n{jd_text[:1500]}"
+
+    response = await client.chat.completions.create(
+        model=SCORING_MODEL,
         messages=[
-            {"role": "system", "content": "You are a strict ATS algorithm. Output valid JSON only."},
-            {"role": "user", "content": prompt}
+            {"role": "system", "content": ATS_SYSTEM_PROMPT},
+            {"role": "user", "content": user_content}
         ],
-        response_format={ "type": "json_object" },
+        response_format=ATS_SCORES_SCHEMA,
         temperature=0.2
     )
     return json.loads(response.choices[0].message.content)
 
-def optimize_resume(client, resume_text, jd_text, model="gpt-4o"):
-    prompt = f"""
-    You are an expert Resume Writer specializing in beating ATS algorithms.
-    Your goal is to rewrite the provided resume to get a 95% match score against the Job Description.
-
-    INSTRUCTIONS:
-    1. **Keyword Mirroring**: Identify hard skills and keywords in the JD. Use the EXACT SAME PHRASING in the resume.
-    2. **Summary**: Rewrite the Professional Summary to be a 3-sentence pitch directly addressing the JD's top requirements.
-    3. **Experience**: Keep the user's actual companies and dates. Rewrite the bullet points to emphasize results using keywords from the JD.
-    4. **Skills Section**: Create a dedicated "Technical Skills" or "Core Competencies" section. Fill it with matching skills from the JD that the candidate possesses.
-    5. **Honesty**: Do not invent jobs. If a skill is strictly missing, do not lie, but emphasize adjacent skills.
-    
-    FORMAT: 
-    Clean text format suitable for copy-pasting into Word. No markdown bolding (**), just plain text with bullet points (-).
+async def optimize_resume(client, resume_text, jd_text, model="gpt-4o", placeholder=None):
+    # Cap input size: tokens are billed per character sent, and long
+    # contexts make the model slower too.
+    resume_text = smart_trim(resume_text, 6000)
+    jd_text = smart_trim(jd_text, 2500)
 
-    RESUME: {resume_text}
-    JD: {jd_text}
-    """
-    
-    response = client.chat.completions.create(
+    # Stream tokens as they arrive so the first bytes reach the user in
+    # ~500ms instead of after the whole completion finishes.
+    response = await client.chat.completions.create(
         model=model,
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0.5
+        messages=[
+            {"role": "system", "content": OPTIMIZE_SYSTEM_PROMPT},
+            {"role": "user", "content": f"RESUME:\n{resume_text}\n\nJD:\n{jd_text}"}
+        ],
+        temperature=0.5,
+        stream=True
     )
-    return response.choices[0].message.content
+    parts = []
+    async for chunk in response:
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta.content or ""
+        if delta:
+            parts.append(delta)
+            if placeholder is not None:
+                placeholder.text_area("Live Resume Preview", "".join(parts), height=400)
+    return "".join(parts)
 
-def generate_cover_letter(client, resume_text, jd_text, model="gpt-4o"):
-    prompt = f"""
-    Write a compelling cover letter for this job.
-    
-    GUIDELINES:
-    1. Tone: Enthusiastic, Professional, Direct.
-    2. Hook: Start with why the candidate fits the specific role title in the JD.
-    3. Body: Highlight 3 key achievements from the resume that solve problems listed in the JD.
-    4. Call to Action: Request an interview.
-    
-    RESUME: {resume_text}
-    JD: {jd_text}
-    """
-    response = client.chat.completions.create(
+async def generate_cover_letter(client, resume_text, jd_text, model="gpt-4o"):
+    resume_text = smart_trim(resume_text, 6000)
+    jd_text = smart_trim(jd_text, 2500)
+    response = await client.chat.completions.create(
         model=model,
-        messages=[{"role": "user", "content": prompt}],
+        messages=[
+            {"role": "system", "content": COVER_SYSTEM_PROMPT},
+            {"role": "user", "content": f"RESUME:\n{resume_text}\n\nJD:\n{jd_text}"}
+        ],
         temperature=0.7
     )
     return response.choices[0].message.content
 
+async def run_pipeline(api_key, resume_text, jd_text, model, placeholder=None):
+    """
+    Runs the full generation pipeline. Optimization and the cover letter
+    only depend on (resume_text, jd_text), so they run concurrently; both
+    resumes are then scored together in a single batched analysis.
+    """
+    async with make_async_client(api_key) as client:
+        optimized_resume, cover_letter = await asyncio.gather(
+            optimize_resume(client, resume_text, jd_text, model, placeholder=placeholder),
+            generate_cover_letter(client, resume_text, jd_text, model)
+        )
+        analysis = await analyze_two_resumes(client, resume_text, optimized_resume, jd_text)
+    return optimized_resume, cover_letter, analysis
+
 # --- MAIN UI ---
 
 def main():
@@ -161,40 +327,29 @@ def main():
             st.error("Please upload a resume and provide a job description.")
             return
 
-        client = openai.OpenAI(api_key=api_key)
-        
         # Processing Steps
         with st.status("🤖 AI Architect is working...", expanded=True) as status:
-            
-            # 1. Text Extraction
+
+            # 1. Text Extraction (grab the bytes once; the wrapper is cached)
             status.write("Reading document...")
-            if uploaded_file.name.endswith(".pdf"):
-                resume_text = extract_text_from_pdf(uploaded_file)
-            else:
-                resume_text = extract_text_from_docx(uploaded_file)
-
-            # 2. Original Analysis
-            status.write("Analyzing original match score...")
-            original_analysis = analyze_resume(client, resume_text, jd_text, model_choice)
-            
-            # 3. Generation
-            status.write("Rewriting resume for ATS optimization...")
-            optimized_resume = optimize_resume(client, resume_text, jd_text, model_choice)
-            
-            status.write("Drafting cover letter...")
-            cover_letter = generate_cover_letter(client, resume_text, jd_text, model_choice)
+            resume_text = extract_text(uploaded_file.name, uploaded_file.getvalue())
+
+            # 2. Analysis + Generation (analyze/optimize/cover letter run
+            # concurrently, then the optimized resume is re-scored)
+            status.write("Optimizing resume and drafting cover letter...")
+            preview = st.empty()
+            optimized_resume, cover_letter, analysis = asyncio.run(
+                run_pipeline(api_key, resume_text, jd_text, model_choice, placeholder=preview)
+            )
+            preview.empty()  # final text is rendered in the results tabs below
 
-            # 4. Final Analysis (Verify new score)
-            status.write("Verifying new match score...")
-            new_analysis = analyze_resume(client, optimized_resume, jd_text, model_choice)
-            
             status.update(label="✅ Processing Complete!", state="complete", expanded=False)
 
             # Store results in session state
             st.session_state.results = {
-                "original_score": original_analysis['match_score'],
-                "original_tips": original_analysis['tips'],
-                "new_score": new_analysis['match_score'],
+                "original_score": analysis['a']['match_score'],
+                "original_tips": analysis['a']['tips'],
+                "new_score": analysis['b']['match_score'],
                 "optimized_resume": optimized_resume,
                 "cover_letter": cover_letter
             }
@@ -226,7 +381,7 @@ def main():
             st.text_area("Resume Preview", res['optimized_resume'], height=500)
             st.download_button(
                 label="Download Resume (.docx)",
-                data=create_docx(res['optimized_resume']),
+                data=create_docx_cached(res['optimized_resume']),
                 file_name="Optimized_Resume.docx",
                 mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document"
             )
@@ -235,7 +390,7 @@ def main():
             st.text_area("Cover Letter Preview", res['cover_letter'], height=500)
             st.download_button(
                 label="Download Cover Letter (.docx)",
-                data=create_docx(res['cover_letter']),
+                data=create_docx_cached(res['cover_letter']),
                 file_name="Cover_Letter.docx",
                 mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document"
             )
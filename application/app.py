@@ -1,430 +1,1019 @@
-import streamlit as st
-from openai import OpenAI
-import pdfplumber
-import docx
-from io import BytesIO
-import json
-import datetime
-import pandas as pd
-import time
-import base64
-from astrapy import DataAPIClient
-
-# --- CONFIGURATION ---
-st.set_page_config(
-    page_title="AI Resume Architect",
-    layout="wide",
-    page_icon="🚀",
-    initial_sidebar_state="collapsed"
-)
-
-# --- 1. DATABASE CONNECTION ---
-@st.cache_resource
-def get_db_collection():
-    """
-    Connects to Astra DB with retry logic and configures indexing
-    to bypass 8KB limit on large text fields.
-    """
-    # Load secrets
-    try:
-        token = st.secrets["ASTRA_DB_APPLICATION_TOKEN"]
-        endpoint = st.secrets["ASTRA_DB_API_ENDPOINT"]
-    except Exception:
-        return None
-
-    client = DataAPIClient(token)
-    db = client.get_database_by_api_endpoint(endpoint)
-    COLLECTION_NAME = "resume_transactions_openai_v1"
-
-    # Retry logic for Serverless Cold Starts
-    max_retries = 3
-    for attempt in range(max_retries):
-        try:
-            existing_collections = db.list_collection_names()
-            
-            if COLLECTION_NAME in existing_collections:
-                return db.get_collection(COLLECTION_NAME)
-            else:
-                # Create collection with NO indexing on large text fields
-                db.command({
-                    "createCollection": {
-                        "name": COLLECTION_NAME,
-                        "options": {
-                            "indexing": {
-                                "deny": [
-                                    "original_resume_text", 
-                                    "generated_resume", 
-                                    "generated_cover_letter", 
-                                    "job_description",
-                                    "original_file_base64"
-                                ]
-                            }
-                        }
-                    }
-                })
-                return db.get_collection(COLLECTION_NAME)
-
-        except Exception as e:
-            if "timeout" in str(e).lower() and attempt < max_retries - 1:
-                time.sleep(3)
-                continue
-            return None
-    return None
-
-def save_transaction_to_db(data):
-    collection = get_db_collection()
-    if collection:
-        try:
-            collection.insert_one(data)
-            return True
-        except Exception as e:
-            st.error(f"DB Save Error: {e}")
-            return False
-    return False
-
-def fetch_transactions():
-    collection = get_db_collection()
-    if not collection: return []
-    try:
-        # Fetch last 50 transactions
-        cursor = collection.find({}, sort={"timestamp": -1}, limit=50)
-        return list(cursor)
-    except Exception:
-        return []
-
-# --- 2. HELPER FUNCTIONS ---
-
-def extract_text(uploaded_file):
-    text = ""
-    try:
-        if uploaded_file.type == "application/pdf":
-            with pdfplumber.open(uploaded_file) as pdf:
-                for page in pdf.pages:
-                    text += page.extract_text() or ""
-        elif uploaded_file.type == "application/vnd.openxmlformats-officedocument.wordprocessingml.document":
-            doc = docx.Document(uploaded_file)
-            text = "\n".join([para.text for para in doc.paragraphs])
-        return text
-    except Exception as e:
-        st.error(f"Error reading file: {e}")
-        return None
-
-def create_docx(text):
-    doc = docx.Document()
-    # Handle empty text
-    if not text:
-        text = ""
-    for line in text.split('\n'):
-        doc.add_paragraph(line)
-    buffer = BytesIO()
-    doc.save(buffer)
-    buffer.seek(0)
-    return buffer
-
-def file_to_base64(uploaded_file):
-    """Convert uploaded file to base64 string for DB storage"""
-    try:
-        bytes_data = uploaded_file.getvalue()
-        return base64.b64encode(bytes_data).decode('utf-8')
-    except:
-        return ""
-
-def base64_to_bytes(base64_string):
-    """Convert base64 string back to bytes for download"""
-    return base64.b64decode(base64_string)
-
-# --- 3. AI SERVICES (OPENAI) ---
-
-def get_openai_client():
-    try:
-        api_key = st.secrets["OPENAI_API_KEY"]
-        return OpenAI(api_key=api_key)
-    except Exception:
-        st.error("OPENAI_API_KEY not found in secrets.")
-        return None
-
-def analyze_resume(text, jd):
-    client = get_openai_client()
-    if not client: return {"match_score": 0, "tips": []}
-    
-    prompt = f"""
-    Act as a strict ATS. Compare the Resume against the Job Description.
-    Output a raw JSON object with these keys: "match_score" (number 0-100), "missing_keywords" (list of strings), "tips" (list of strings).
-    
-    RESUME: {text[:10000]}
-    JD: {jd[:5000]}
-    """
-    
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": "You are a helpful assistant. Output only valid JSON."},
-                {"role": "user", "content": prompt}
-            ],
-            response_format={"type": "json_object"}
-        )
-        return json.loads(response.choices[0].message.content)
-    except Exception as e:
-        st.error(f"Analysis Error: {e}")
-        return {"match_score": 0, "tips": ["Error analyzing resume"]}
-
-def optimize_resume(text, jd):
-    client = get_openai_client()
-    if not client: return ""
-    
-    prompt = f"""
-    Rewrite this resume to get a 95% match score against the JD.
-    Use "Keyword Mirroring" (use exact phrasing from JD).
-    Keep actual companies/dates but rewrite bullets to focus on results.
-    Return clean Markdown.
-    
-    RESUME: {text}
-    JD: {jd}
-    """
-    
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": "You are an expert resume writer."},
-                {"role": "user", "content": prompt}
-            ]
-        )
-        return response.choices[0].message.content
-    except Exception as e:
-        st.error(f"Optimization Error: {e}")
-        return ""
-
-def generate_cover_letter(text, jd, length_type):
-    client = get_openai_client()
-    if not client: return ""
-    
-    length_prompt = {
-        "Condensed": "Keep it under 200 words. Punchy and direct.",
-        "Medium": "Standard professional length (300 words). Balanced.",
-        "Elaborate": "Detailed storytelling (450+ words). Deep dive into achievements."
-    }
-    
-    prompt = f"""
-    Write a cover letter based on this resume and JD.
-    Style: {length_prompt.get(length_type, "Medium")}
-    Return clean Markdown.
-    
-    RESUME: {text}
-    JD: {jd}
-    """
-    
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": "You are a professional career coach."},
-                {"role": "user", "content": prompt}
-            ]
-        )
-        return response.choices[0].message.content
-    except Exception as e:
-        st.error(f"Cover Letter Error: {e}")
-        return ""
-
-# --- 4. UI PAGES ---
-
-def generator_page():
-    st.title("🚀 AI Resume Architect")
-    
-    # Init session state
-    if "generated" not in st.session_state:
-        st.session_state.generated = None
-
-    col1, col2 = st.columns([1, 1])
-    
-    with col1:
-        st.subheader("1. Upload Resume")
-        uploaded_file = st.file_uploader("Upload PDF or DOCX", type=["pdf", "docx"])
-        
-        st.subheader("3. Options")
-        cl_length = st.select_slider("Cover Letter Length", options=["Condensed", "Medium", "Elaborate"], value="Medium")
-
-    with col2:
-        st.subheader("2. Job Description")
-        jd_text = st.text_area("Paste JD here", height=200)
-
-    if st.button("Generate Application", type="primary"):
-        if not uploaded_file or not jd_text:
-            st.warning("Please provide both a resume and a job description.")
-            return
-        
-        with st.status("Architecting Application...", expanded=True) as status:
-            # 1. Extract Text
-            status.write("Reading document...")
-            resume_text = extract_text(uploaded_file)
-            
-            if not resume_text:
-                status.update(label="Failed to read file", state="error")
-                return
-
-            # 2. Analyze Original
-            status.write("Analyzing original match score...")
-            original_analysis = analyze_resume(resume_text, jd_text)
-            
-            # 3. Optimize Resume & Cover Letter
-            status.write("Optimizing resume & drafting cover letter...")
-            optimized_text = optimize_resume(resume_text, jd_text)
-            cover_letter_text = generate_cover_letter(resume_text, jd_text, cl_length)
-            
-            # 4. Analyze New
-            status.write("Verifying new match score...")
-            new_analysis = analyze_resume(optimized_text, jd_text)
-            
-            # 5. Save to DB
-            status.write("Saving transaction to Astra DB...")
-            timestamp = datetime.datetime.now().isoformat()
-            
-            transaction_data = {
-                "timestamp": timestamp,
-                "job_title": jd_text.split('\n')[0][:50],
-                "job_description": jd_text,
-                "original_filename": uploaded_file.name,
-                "original_file_base64": file_to_base64(uploaded_file),
-                "original_score": original_analysis.get('match_score', 0),
-                "optimized_score": new_analysis.get('match_score', 0),
-                "critical_keywords": new_analysis.get('missing_keywords', []), # Storing new analysis keywords as 'targeted'
-                "improvements": original_analysis.get('tips', []),
-                "original_resume_text": resume_text,
-                "generated_resume": optimized_text,
-                "generated_cover_letter": cover_letter_text
-            }
-            
-            save_transaction_to_db(transaction_data)
-            
-            # Save to session state to prevent reload loss
-            st.session_state.generated = {
-                "original_stats": original_analysis,
-                "new_stats": new_analysis,
-                "optimized_resume": optimized_text,
-                "cover_letter": cover_letter_text
-            }
-            
-            status.update(label="Complete!", state="complete", expanded=False)
-
-    # --- RESULTS DISPLAY ---
-    if st.session_state.generated:
-        res = st.session_state.generated
-        
-        st.divider()
-        
-        # Scoreboard
-        c1, c2, c3 = st.columns(3)
-        with c1:
-            st.metric("Original Score", f"{res['original_stats'].get('match_score', 0)}%")
-        with c2:
-            st.metric("Optimized Score", f"{res['new_stats'].get('match_score', 0)}%", 
-                     delta=res['new_stats'].get('match_score', 0) - res['original_stats'].get('match_score', 0))
-        with c3:
-            st.info(f"**Top Tip:** {res['original_stats'].get('tips', [''])[0]}")
-
-        # Downloads & Previews
-        tab1, tab2 = st.tabs(["📄 Optimized Resume", "✉️ Cover Letter"])
-        
-        with tab1:
-            col_d1, col_d2 = st.columns([1, 4])
-            with col_d1:
-                st.download_button(
-                    "Download .docx",
-                    data=create_docx(res['optimized_resume']),
-                    file_name="Optimized_Resume.docx",
-                    mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document"
-                )
-            with col_d2:
-                st.markdown(res['optimized_resume'])
-                
-        with tab2:
-            col_d1, col_d2 = st.columns([1, 4])
-            with col_d1:
-                st.download_button(
-                    "Download .docx",
-                    data=create_docx(res['cover_letter']),
-                    file_name="Cover_Letter.docx",
-                    mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document"
-                )
-            with col_d2:
-                st.markdown(res['cover_letter'])
-
-def admin_page():
-    st.header("🔒 Admin Dashboard")
-    
-    # Simple password check against secrets
-    try:
-        admin_pass = st.secrets["ADMIN_PASSWORD"]
-    except:
-        st.error("ADMIN_PASSWORD not set in secrets.")
-        return
-
-    pwd_input = st.text_input("Enter Admin Password", type="password")
-    
-    if pwd_input == admin_pass:
-        if st.button("Refresh Data"):
-            st.rerun()
-            
-        transactions = fetch_transactions()
-        
-        if not transactions:
-            st.info("No transactions found in DB.")
-            return
-            
-        # Summary Table
-        df = pd.DataFrame(transactions)
-        st.dataframe(
-            df[['timestamp', 'job_title', 'original_score', 'optimized_score', 'original_filename']],
-            use_container_width=True,
-            hide_index=True
-        )
-        
-        st.divider()
-        
-        # Detailed View
-        tx_options = {f"{t['timestamp']} - {t['job_title']}": t for t in transactions}
-        selected_tx_key = st.selectbox("Select Transaction Details", list(tx_options.keys()))
-        
-        if selected_tx_key:
-            tx = tx_options[selected_tx_key]
-            
-            c1, c2, c3 = st.columns(3)
-            c1.metric("Original", f"{tx.get('original_score')}%")
-            c2.metric("Optimized", f"{tx.get('optimized_score')}%")
-            
-            # Downloads
-            d1, d2, d3 = st.columns(3)
-            
-            # Original File Download
-            if tx.get('original_file_base64'):
-                try:
-                    file_bytes = base64_to_bytes(tx['original_file_base64'])
-                    d1.download_button("⬇️ Original File", file_bytes, tx.get('original_filename', 'resume'))
-                except:
-                    d1.error("File corrupted")
-            
-            d2.download_button("⬇️ Optimized Resume", create_docx(tx.get('generated_resume', '')), "Optimized.docx")
-            d3.download_button("⬇️ Cover Letter", create_docx(tx.get('generated_cover_letter', '')), "CoverLetter.docx")
-
-            with st.expander("View Job Description"):
-                st.text(tx.get('job_description'))
-                
-            with st.expander("View Improvements Made"):
-                st.write(tx.get('improvements'))
-
-# --- 5. MAIN APP ROUTER ---
-
-def main():
-    # Sidebar Navigation
-    st.sidebar.title("Navigation")
-    page = st.sidebar.radio("Go to", ["Generator", "Admin Dashboard"])
-    
-    if page == "Generator":
-        generator_page()
-    else:
-        admin_page()
-
-if __name__ == "__main__":
-    main()
+import streamlit as st
+from openai import AsyncOpenAI
+from pydantic import BaseModel
+import asyncio
+import pdfplumber
+import pypdfium2 as pdfium
+import docx
+from io import BytesIO
+import json
+import datetime
+import uuid
+import pandas as pd
+import time
+import base64
+import gzip
+import zlib
+import hashlib
+import atexit
+import threading
+import tiktoken
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from astrapy import DataAPIClient
+
+# --- CONFIGURATION ---
+st.set_page_config(
+    page_title="AI Resume Architect",
+    layout="wide",
+    page_icon="🚀",
+    initial_sidebar_state="collapsed"
+)
+
+# --- 1. DATABASE CONNECTION ---
+
+# Collection names already confirmed to exist in Astra. Shared across the
+# collection getters so only the first one pays the HTTP existence probe.
+_known_collections = set()
+
+@st.cache_resource
+def get_db():
+    """Returns the shared Astra database handle, or None if unconfigured."""
+    try:
+        token = st.secrets["ASTRA_DB_APPLICATION_TOKEN"]
+        endpoint = st.secrets["ASTRA_DB_API_ENDPOINT"]
+    except Exception:
+        return None
+    return DataAPIClient(token).get_database_by_api_endpoint(endpoint)
+
+def ping_db():
+    """
+    Cheap read-only health check. Unlike the collection getters, this
+    never touches the create path, so it is safe to call on every admin
+    visit.
+    """
+    db = get_db()
+    if db is None:
+        return False
+    try:
+        _known_collections.update(db.list_collection_names())
+        return True
+    except Exception:
+        return False
+
+@st.cache_data(ttl=60, show_spinner=False)
+def ping_db_cached():
+    """
+    Short-TTL cache over the health check: every authenticated admin
+    rerun (selectbox change, password resubmit) would otherwise block on
+    a fresh list_collection_names round trip. The Refresh button clears
+    it alongside the transaction list.
+    """
+    return ping_db()
+
+@st.cache_resource
+def get_db_collection():
+    """
+    Connects to Astra DB with retry logic and ensures the transactions
+    collection exists with its indexing spec.
+    """
+    db = get_db()
+    if db is None:
+        return None
+    COLLECTION_NAME = "resume_transactions_openai_v1"
+
+    if COLLECTION_NAME in _known_collections:
+        return db.get_collection(COLLECTION_NAME)
+
+    # Retry logic for Serverless Cold Starts
+    max_retries = 3
+    for attempt in range(max_retries):
+        try:
+            # createCollection is a no-op when the collection already
+            # exists with the same options, so the list_collection_names
+            # probe (one extra HTTP round trip per cold start) is skipped.
+            # Index only "timestamp": fetch_transactions sorts on it, and
+            # without the index Astra falls back to an in-memory sort over
+            # the whole collection. Everything else (snippets, tips,
+            # keywords) is display-only. The vector spec powers the
+            # semantic response cache (text-embedding-3-small is 1536-dim).
+            db.command({
+                "createCollection": {
+                    "name": COLLECTION_NAME,
+                    "options": {
+                        "indexing": {
+                            "allow": ["timestamp"]
+                        },
+                        "vector": {
+                            "dimension": 1536,
+                            "metric": "cosine"
+                        }
+                    }
+                }
+            })
+            _known_collections.add(COLLECTION_NAME)
+            return db.get_collection(COLLECTION_NAME)
+
+        except Exception as e:
+            if "timeout" in str(e).lower() and attempt < max_retries - 1:
+                time.sleep(3)
+                continue
+            # Most likely a collection created under the older options
+            # spec; use it as-is rather than failing the app.
+            _known_collections.add(COLLECTION_NAME)
+            return db.get_collection(COLLECTION_NAME)
+    return None
+
+@st.cache_resource
+def get_blobs_collection():
+    """
+    Returns the Astra collection holding the full resume/JD/letter bodies.
+    Transactions only keep snippets plus a blob_id pointing here, so the
+    admin list query stays small. Returns None if DB is not configured.
+    """
+    db = get_db()
+    if db is None:
+        return None
+    BLOBS_NAME = "resume_blobs_v1"
+
+    if BLOBS_NAME in _known_collections:
+        return db.get_collection(BLOBS_NAME)
+
+    try:
+        # No-op if the collection already exists with these options
+        db.command({
+            "createCollection": {
+                "name": BLOBS_NAME,
+                "options": {
+                    "indexing": {
+                        "deny": [
+                            "original_resume_text",
+                            "generated_resume",
+                            "generated_cover_letter",
+                            "job_description",
+                            "original_file_base64"
+                        ]
+                    }
+                }
+            }
+        })
+        _known_collections.add(BLOBS_NAME)
+        return db.get_collection(BLOBS_NAME)
+    except Exception:
+        return None
+
+@st.cache_resource
+def get_llm_cache_collection():
+    """
+    Returns the Astra collection used as a persistent exact-match cache
+    for LLM responses. Returns None if DB is not configured.
+    """
+    db = get_db()
+    if db is None:
+        return None
+    CACHE_NAME = "llm_cache_openai_v1"
+
+    if CACHE_NAME in _known_collections:
+        return db.get_collection(CACHE_NAME)
+
+    try:
+        # No-op if the collection already exists with these options
+        db.command({
+            "createCollection": {
+                "name": CACHE_NAME,
+                "options": {"indexing": {"deny": ["content"]}}
+            }
+        })
+        _known_collections.add(CACHE_NAME)
+        return db.get_collection(CACHE_NAME)
+    except Exception:
+        return None
+
+# Large text fields compress 3-4x with zlib, and the blobs collection
+# denies indexing on them anyway, so nothing needs them searchable. The
+# "z1:" prefix versions the format so old uncompressed rows still read.
+_PACKED_BLOB_FIELDS = ("job_description", "original_resume_text",
+                       "generated_resume", "generated_cover_letter")
+
+def _pack(s):
+    """Compresses a text field for storage; 'z1:' marks the format."""
+    if not s:
+        return s
+    return "z1:" + base64.b64encode(zlib.compress(s.encode("utf-8"), 6)).decode("ascii")
+
+def _unpack(s):
+    """Inverse of _pack; passes legacy uncompressed values through."""
+    if isinstance(s, str) and s.startswith("z1:"):
+        try:
+            return zlib.decompress(base64.b64decode(s[3:])).decode("utf-8")
+        except Exception:
+            return s
+    return s
+
+def save_transaction_to_db(data, blob=None):
+    collection = get_db_collection()
+    if collection:
+        try:
+            if blob is not None:
+                blobs = get_blobs_collection()
+                if blobs:
+                    blob = {
+                        key: _pack(value) if key in _PACKED_BLOB_FIELDS else value
+                        for key, value in blob.items()
+                    }
+                    blobs.insert_one(blob)
+            try:
+                collection.insert_one(data)
+            except Exception:
+                # Deployments whose collection predates the vector spec
+                # reject documents carrying "$vector"; retry without it so
+                # the transaction log keeps working there.
+                if "$vector" not in data:
+                    raise
+                data = {k: v for k, v in data.items() if k != "$vector"}
+                collection.insert_one(data)
+            return True
+        except Exception as e:
+            # May run on a background thread, so no st.error here
+            print(f"DB Save Error: {e}")
+            return False
+    return False
+
+@st.cache_resource
+def get_db_executor():
+    # Bounded writer pool for fire-and-forget logging. Unlike a bare
+    # daemon thread, queued inserts survive until the atexit drain on
+    # shutdown. Built behind cache_resource: a module-level pool would be
+    # re-created (and re-registered with atexit, which pins each one in
+    # memory) on every rerun.
+    executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="astra-log")
+    atexit.register(executor.shutdown, wait=True)
+    return executor
+
+def save_transaction_async(data, blob=None):
+    """
+    Fire-and-forget DB write. The UI never reads the insert result, so
+    there is no reason to hold the status spinner on the Astra RTT.
+    """
+    # Resolve the collection handles on the main thread (st.cache_resource
+    # and st.secrets belong to the script thread), then write off-thread.
+    get_db_collection()
+    get_blobs_collection()
+    get_db_executor().submit(save_transaction_to_db, data, blob)
+
+def fetch_transactions():
+    collection = get_db_collection()
+    if not collection: return []
+    try:
+        # Fetch last 50 transactions, pulling only what the summary table
+        # shows; the full row is fetched on selection. _id is kept solely
+        # as the detail-fetch key — it never enters the admin DataFrame,
+        # so no per-row string conversion happens on it.
+        cursor = collection.find(
+            {},
+            projection={
+                "timestamp": 1,
+                "job_title": 1,
+                "original_score": 1,
+                "optimized_score": 1,
+                "original_filename": 1,
+                "_id": 1
+            },
+            sort={"timestamp": -1},
+            limit=50
+        )
+        return list(cursor)
+    except Exception:
+        return []
+
+@st.cache_data(ttl=60, show_spinner=False)
+def fetch_transactions_cached():
+    """
+    Short-TTL cache over the admin list: every rerun on the admin page
+    (password retype, selectbox change) would otherwise re-scan Astra.
+    The Refresh button clears it explicitly.
+    """
+    return fetch_transactions()
+
+@st.cache_data(max_entries=20, show_spinner=False)
+def fetch_transaction_detail(tx_id):
+    """
+    Fetches one full transaction document for the detail view. Cached per
+    _id so flipping between rows (or any rerun) doesn't re-pull documents
+    already seen.
+    """
+    collection = get_db_collection()
+    if not collection or tx_id is None: return None
+    try:
+        return collection.find_one({"_id": tx_id})
+    except Exception:
+        return None
+
+@st.cache_data(max_entries=20, show_spinner=False)
+def fetch_blob(blob_id):
+    """Fetches the full text bodies for one transaction, on demand."""
+    blobs = get_blobs_collection()
+    if not blobs or not blob_id: return None
+    try:
+        doc = blobs.find_one({"_id": blob_id})
+        if doc:
+            for key in _PACKED_BLOB_FIELDS:
+                if key in doc:
+                    doc[key] = _unpack(doc[key])
+        return doc
+    except Exception:
+        return None
+
+# --- 2. HELPER FUNCTIONS ---
+
+def extract_text(file_bytes, filename):
+    # Parsers get a full in-memory BytesIO: going through the streamed
+    # UploadedFile wrapper costs many small read()/seek calls per page.
+    text = ""
+    try:
+        if filename.lower().endswith(".pdf"):
+            # pdfium (C++-backed) extracts plain text several times
+            # faster than pdfplumber's pure-Python layout analysis, and
+            # layout fidelity doesn't matter for LLM input. pdfplumber
+            # stays as the fallback for PDFs pdfium can't parse.
+            try:
+                pdf = pdfium.PdfDocument(file_bytes)
+                try:
+                    text = "\n".join(page.get_textpage().get_text_range() for page in pdf)
+                finally:
+                    pdf.close()
+            except Exception:
+                # List + join is linear time (+= recopies the growing
+                # string per page); the looser tolerances cut pdfplumber's
+                # char-clustering work, and empty pages are skipped.
+                parts = []
+                with pdfplumber.open(BytesIO(file_bytes)) as pdf:
+                    for page in pdf.pages:
+                        t = page.extract_text(x_tolerance=2, y_tolerance=3)
+                        if t:
+                            parts.append(t)
+                text = "\n".join(parts)
+        elif filename.lower().endswith(".docx"):
+            doc = docx.Document(BytesIO(file_bytes))
+            text = "\n".join([para.text for para in doc.paragraphs])
+        return text
+    except Exception as e:
+        st.error(f"Error reading file: {e}")
+        return None
+
+@st.cache_data(ttl=3600, max_entries=50, show_spinner=False)
+def extract_text_cached(file_bytes, filename):
+    """
+    Caches extraction keyed by (file bytes, filename) so Streamlit reruns
+    don't re-parse an unchanged upload.
+    """
+    return extract_text(file_bytes, filename)
+
+def create_docx(text):
+    doc = docx.Document()
+    # Handle empty text
+    if not text:
+        text = ""
+    # One paragraph with explicit line breaks: add_paragraph per line
+    # pays a style lookup and a full <w:p> element per line, which adds
+    # up over the hundreds of lines in a generated resume.
+    paragraph = doc.add_paragraph()
+    run = paragraph.add_run()
+    for i, line in enumerate(text.split('\n')):
+        if i:
+            run.add_break()
+        run.add_text(line)
+    buffer = BytesIO()
+    doc.save(buffer)
+    buffer.seek(0)
+    return buffer
+
+@st.cache_data(max_entries=50, show_spinner=False)
+def create_docx_cached(text):
+    """
+    Memoized DOCX bytes per text. Download buttons need their payload on
+    every rerun, so without this each row selection rebuilds documents
+    the user may never download.
+    """
+    return create_docx(text).getvalue()
+
+def file_to_base64(uploaded_file):
+    """
+    Gzip + base64 the uploaded file for DB storage. Plain base64 inflates
+    the bytes by 33%; compressing first shrinks typical PDFs 2-3x, which
+    matters because the blob lives inside a JSON document in Astra.
+    """
+    try:
+        bytes_data = uploaded_file.getvalue()
+        return base64.b64encode(gzip.compress(bytes_data)).decode('utf-8')
+    except:
+        return ""
+
+def base64_to_bytes(base64_string):
+    """Convert stored base64 back to bytes; handles old uncompressed rows"""
+    raw = base64.b64decode(base64_string)
+    if raw[:2] == b"\x1f\x8b":  # gzip magic
+        try:
+            return gzip.decompress(raw)
+        except Exception:
+            pass
+    return raw
+
+# --- 3. AI SERVICES (OPENAI) ---
+
+def make_openai_client():
+    # One async client per event loop, built inside run_submission: its
+    # connection pool serves all concurrent calls in that generation.
+    # Deliberately NOT process-cached — each asyncio.run spins a fresh
+    # loop, and a pooled keep-alive connection bound to an earlier
+    # (closed) loop raises "Event loop is closed" when reused.
+    try:
+        api_key = st.secrets["OPENAI_API_KEY"]
+        return AsyncOpenAI(api_key=api_key, max_retries=3)
+    except Exception:
+        st.error("OPENAI_API_KEY not found in secrets.")
+        return None
+
+class RequestRateLimiter:
+    """
+    Sliding-window request throttle shared by every OpenAI call in the
+    process. It is thread-safe rather than loop-bound (unlike
+    aiolimiter.AsyncLimiter) because each Streamlit session/rerun runs
+    its own event loop, and concurrent users must share one budget.
+    """
+    def __init__(self, max_calls, period):
+        self.max_calls = max_calls
+        self.period = period
+        self._lock = threading.Lock()
+        self._calls = deque()
+
+    async def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                while self._calls and now - self._calls[0] >= self.period:
+                    self._calls.popleft()
+                if len(self._calls) < self.max_calls:
+                    self._calls.append(now)
+                    return
+                wait = self.period - (now - self._calls[0])
+            await asyncio.sleep(wait)
+
+@st.cache_resource
+def get_llm_limiter():
+    # Keep comfortably under the account's RPM cap; hitting it turns into
+    # user-visible failures instead of short deterministic waits. Built
+    # behind cache_resource so one window survives reruns and is shared
+    # by every session — a module-level instance would be recreated empty
+    # on each script run and never throttle anything.
+    return RequestRateLimiter(max_calls=30, period=60.0)
+
+@st.cache_resource
+def get_chat_memo():
+    # In-process layer of the LLM cache. Held behind cache_resource so it
+    # survives reruns (a module-level dict is rebuilt empty on each
+    # script run and would never hit); st.cache_data itself can't wrap an
+    # async function.
+    return {}
+
+async def cached_chat(client, model, messages_json, temperature=None, response_format_json=None):
+    """
+    Exact-match LLM response cache. The request (model, messages,
+    temperature, response_format) is hashed with SHA-256 and looked up
+    in memory, then in Astra, so a re-run with identical inputs skips
+    the API call entirely.
+    """
+    cache_key = hashlib.sha256(
+        f"{model}|{temperature}|{response_format_json}|{messages_json}".encode("utf-8")
+    ).hexdigest()
+
+    memo = get_chat_memo()
+    if cache_key in memo:
+        return memo[cache_key]
+
+    cache = get_llm_cache_collection()
+    if cache:
+        try:
+            # astrapy is synchronous; keep the event loop free for the
+            # other gathered calls while this lookup is in flight.
+            hit = await asyncio.to_thread(cache.find_one, {"_id": cache_key})
+            if hit:
+                memo[cache_key] = hit["content"]
+                return hit["content"]
+        except Exception:
+            pass
+
+    if not client:
+        raise RuntimeError("OpenAI client not configured")
+
+    kwargs = {}
+    if temperature is not None:
+        kwargs["temperature"] = temperature
+    if response_format_json:
+        kwargs["response_format"] = json.loads(response_format_json)
+
+    await get_llm_limiter().acquire()
+    response = await client.chat.completions.create(
+        model=model,
+        messages=json.loads(messages_json),
+        **kwargs
+    )
+    content = response.choices[0].message.content
+    memo[cache_key] = content
+
+    if cache:
+        try:
+            await asyncio.to_thread(cache.insert_one, {"_id": cache_key, "content": content})
+        except Exception:
+            pass
+    return content
+
+@st.cache_resource
+def get_token_encoder():
+    # Loading the BPE ranks takes noticeable time; do it once per process
+    return tiktoken.get_encoding("cl100k_base")
+
+def clip_tokens(text, n_tokens):
+    """
+    Hard-caps text at n_tokens. Character slicing can overshoot the
+    budget badly on dense text; clipping in token space bounds the
+    request cost (and latency) exactly.
+    """
+    encoder = get_token_encoder()
+    tokens = encoder.encode(text)
+    if len(tokens) <= n_tokens:
+        return text
+    return encoder.decode(tokens[:n_tokens])
+
+class Ats(BaseModel):
+    """Typed scoring result; field access replaces .get() chains."""
+    match_score: int = 0
+    missing_keywords: list[str] = []
+    tips: list[str] = []
+
+# Server-side validated schemas for the scoring call; the API guarantees
+# the shape, so invalid-JSON failures (silently masked as match_score 0
+# by the except branch) disappear.
+ATS_FIELDS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "match_score": {"type": "integer", "minimum": 0, "maximum": 100},
+        "missing_keywords": {"type": "array", "items": {"type": "string"}},
+        "tips": {"type": "array", "items": {"type": "string"}}
+    },
+    "required": ["match_score", "missing_keywords", "tips"],
+    "additionalProperties": False
+}
+
+ATS_BATCH_SCHEMA = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "AtsBatch",
+        "schema": {
+            "type": "object",
+            "properties": {
+                "original": ATS_FIELDS_SCHEMA,
+                "optimized": ATS_FIELDS_SCHEMA
+            },
+            "required": ["original", "optimized"],
+            "additionalProperties": False
+        },
+        "strict": True
+    }
+}
+
+async def analyze_resumes_batch(client, original_text, optimized_text, jd):
+    """
+    Scores the original and optimized resumes against the JD in a single
+    call; batching shares the JD tokens and saves one round trip.
+    Returns a (original, optimized) pair of Ats results.
+    """
+    prompt = f"""
+    Act as a strict ATS. Compare BOTH resumes below against the same Job Description.
+    Output a raw JSON object with keys "original" and "optimized", each holding: "match_score" (number 0-100), "missing_keywords" (list of strings), "tips" (list of strings).
+
+    RESUME_ORIGINAL: {original_text[:10000]}
+    RESUME_OPTIMIZED: {optimized_text[:10000]}
+    JD: {jd[:5000]}
+    """
+
+    try:
+        # Scoring is narrow enough for mini: much cheaper, ~2x faster
+        content = await cached_chat(
+            client,
+            "gpt-4o-mini",
+            json.dumps([
+                {"role": "system", "content": "You are a helpful assistant. Output only valid JSON."},
+                {"role": "user", "content": prompt}
+            ]),
+            response_format_json=json.dumps(ATS_BATCH_SCHEMA)
+        )
+        # The schema is validated server-side, so this parse cannot fail
+        # on shape; it also typechecks content served from the Astra cache.
+        data = json.loads(content)
+        return Ats.model_validate(data["original"]), Ats.model_validate(data["optimized"])
+    except Exception as e:
+        st.error(f"Analysis Error: {e}")
+        return Ats(tips=["Error analyzing resume"]), Ats()
+
+async def optimize_resume(client, text, jd):
+    text = clip_tokens(text, 4000)
+    jd = clip_tokens(jd, 1500)
+    prompt = f"""
+    Rewrite this resume to get a 95% match score against the JD.
+    Use "Keyword Mirroring" (use exact phrasing from JD).
+    Keep actual companies/dates but rewrite bullets to focus on results.
+    Return clean Markdown.
+    
+    RESUME: {text}
+    JD: {jd}
+    """
+    
+    try:
+        return await cached_chat(
+            client,
+            "gpt-4o",
+            json.dumps([
+                {"role": "system", "content": "You are an expert resume writer."},
+                {"role": "user", "content": prompt}
+            ])
+        )
+    except Exception as e:
+        st.error(f"Optimization Error: {e}")
+        return ""
+
+async def generate_cover_letter(client, text, jd, length_type):
+    text = clip_tokens(text, 4000)
+    jd = clip_tokens(jd, 1500)
+    length_prompt = {
+        "Condensed": "Keep it under 200 words. Punchy and direct.",
+        "Medium": "Standard professional length (300 words). Balanced.",
+        "Elaborate": "Detailed storytelling (450+ words). Deep dive into achievements."
+    }
+    
+    prompt = f"""
+    Write a cover letter based on this resume and JD.
+    Style: {length_prompt.get(length_type, "Medium")}
+    Return clean Markdown.
+    
+    RESUME: {text}
+    JD: {jd}
+    """
+    
+    try:
+        return await cached_chat(
+            client,
+            "gpt-4o",
+            json.dumps([
+                {"role": "system", "content": "You are a professional career coach."},
+                {"role": "user", "content": prompt}
+            ])
+        )
+    except Exception as e:
+        st.error(f"Cover Letter Error: {e}")
+        return ""
+
+async def run_generation_pipeline(client, resume_text, jd_text, length_type):
+    """
+    Runs optimization and the cover letter concurrently (each depends
+    only on resume_text + jd_text), then scores both resumes together in
+    one batched call. The semaphore bounds concurrency if more calls are
+    ever added.
+    """
+    semaphore = asyncio.Semaphore(3)
+
+    async def limited(coro):
+        async with semaphore:
+            return await coro
+
+    optimized_text, cover_letter_text = await asyncio.gather(
+        limited(optimize_resume(client, resume_text, jd_text)),
+        limited(generate_cover_letter(client, resume_text, jd_text, length_type))
+    )
+    original_analysis, new_analysis = await analyze_resumes_batch(client, resume_text, optimized_text, jd_text)
+    return original_analysis, optimized_text, cover_letter_text, new_analysis
+
+# --- 3b. SEMANTIC RESPONSE CACHE ---
+
+SEMANTIC_SIMILARITY_THRESHOLD = 0.95
+SEMANTIC_CACHE_TTL = datetime.timedelta(days=7)
+
+async def embed_submission(client, resume_text, jd_text):
+    """Embeds (resume, jd) for the semantic cache; None on any failure."""
+    if not client: return None
+    try:
+        await get_llm_limiter().acquire()
+        response = await client.embeddings.create(
+            model="text-embedding-3-small",
+            input=f"{resume_text[:4000]}\n{jd_text[:2000]}"
+        )
+        return response.data[0].embedding
+    except Exception:
+        return None
+
+def find_similar_transaction(embedding):
+    """Nearest prior transaction by $vector similarity, or None."""
+    collection = get_db_collection()
+    if not collection or embedding is None: return None
+    try:
+        return collection.find_one(
+            {},
+            sort={"$vector": embedding},
+            include_similarity=True,
+            projection={
+                "timestamp": 1,
+                "original_score": 1,
+                "optimized_score": 1,
+                "critical_keywords": 1,
+                "improvements": 1,
+                "blob_id": 1
+            }
+        )
+    except Exception:
+        return None
+
+def semantic_hit_is_fresh(hit):
+    """A hit counts only above the similarity bar and within the TTL."""
+    if hit is None or hit.get("$similarity", 0) < SEMANTIC_SIMILARITY_THRESHOLD:
+        return False
+    try:
+        seen = datetime.datetime.fromisoformat(hit["timestamp"])
+    except Exception:
+        return False
+    return datetime.datetime.now() - seen < SEMANTIC_CACHE_TTL
+
+async def run_submission(resume_text, jd_text, length_type, skip_cache, status=None):
+    """
+    All async work for one click on a single event loop: embedding,
+    semantic-cache probe, then (on a miss) the generation pipeline.
+    Splitting this across two asyncio.run calls would hand the second
+    loop keep-alive connections bound to the first, closed one.
+
+    Returns (embedding, cached_result, generated_results); exactly one of
+    the last two is non-None.
+    """
+    client = make_openai_client()
+    try:
+        if status:
+            status.write("Checking for similar prior submissions...")
+        embedding = await embed_submission(client, resume_text, jd_text)
+        if not skip_cache:
+            hit = find_similar_transaction(embedding)
+            if semantic_hit_is_fresh(hit):
+                blob = fetch_blob(hit.get('blob_id')) or {}
+                if blob.get('generated_resume') and blob.get('generated_cover_letter'):
+                    return embedding, (hit, blob), None
+        if status:
+            status.write("Analyzing, optimizing & drafting concurrently...")
+        results = await run_generation_pipeline(client, resume_text, jd_text, length_type)
+        return embedding, None, results
+    finally:
+        if client:
+            await client.close()
+
+# --- 4. UI PAGES ---
+
+def generator_page():
+    st.title("🚀 AI Resume Architect")
+    
+    # Init session state
+    if "generated" not in st.session_state:
+        st.session_state.generated = None
+
+    col1, col2 = st.columns([1, 1])
+    
+    with col1:
+        st.subheader("1. Upload Resume")
+        uploaded_file = st.file_uploader("Upload PDF or DOCX", type=["pdf", "docx"])
+        
+        st.subheader("3. Options")
+        cl_length = st.select_slider("Cover Letter Length", options=["Condensed", "Medium", "Elaborate"], value="Medium")
+        skip_cache = st.checkbox("Always regenerate (skip similar-submission cache)", value=False)
+
+    with col2:
+        st.subheader("2. Job Description")
+        jd_text = st.text_area("Paste JD here", height=200)
+
+    if st.button("Generate Application", type="primary"):
+        if not uploaded_file or not jd_text:
+            st.warning("Please provide both a resume and a job description.")
+            return
+        
+        with st.status("Architecting Application...", expanded=True) as status:
+            # 1. Extract Text
+            status.write("Reading document...")
+            resume_text = extract_text_cached(uploaded_file.getvalue(), uploaded_file.name)
+            
+            if not resume_text:
+                status.update(label="Failed to read file", state="error")
+                return
+
+            # 2-4. Semantic cache probe, then (on a miss) analyze,
+            # optimize and draft concurrently — one event loop for the
+            # whole click. A near-identical earlier submission
+            # short-circuits all four LLM calls; the embedding is
+            # computed either way so the new transaction is findable
+            # later.
+            embedding, cached, results = asyncio.run(
+                run_submission(resume_text, jd_text, cl_length, skip_cache, status)
+            )
+            if cached is not None:
+                hit, blob = cached
+                st.session_state.generated = {
+                    "original_stats": Ats(
+                        match_score=hit.get('original_score', 0),
+                        tips=hit.get('improvements') or []
+                    ),
+                    "new_stats": Ats(
+                        match_score=hit.get('optimized_score', 0),
+                        missing_keywords=hit.get('critical_keywords') or []
+                    ),
+                    "optimized_resume": blob['generated_resume'],
+                    "cover_letter": blob['generated_cover_letter']
+                }
+                status.update(label="Served from a similar prior submission!",
+                              state="complete", expanded=False)
+                st.rerun()
+            original_analysis, optimized_text, cover_letter_text, new_analysis = results
+            
+            # 5. Save to DB (queued in the background)
+            status.write("Logging transaction to Astra DB...")
+            timestamp = datetime.datetime.now().isoformat()
+            blob_id = str(uuid.uuid4())
+
+            # Hot row: scores + 200-char snippets only. Full bodies go to
+            # the blobs collection and are fetched lazily in the admin view.
+            transaction_data = {
+                "timestamp": timestamp,
+                "job_title": jd_text.split('\n')[0][:50],
+                "job_description_snippet": jd_text[:200],
+                "original_filename": uploaded_file.name,
+                "original_score": original_analysis.match_score,
+                "optimized_score": new_analysis.match_score,
+                "critical_keywords": new_analysis.missing_keywords, # Storing new analysis keywords as 'targeted'
+                "improvements": original_analysis.tips,
+                "resume_snippet": resume_text[:200],
+                "blob_id": blob_id
+            }
+            if embedding is not None:
+                transaction_data["$vector"] = embedding
+
+            blob_data = {
+                "_id": blob_id,
+                "job_description": jd_text,
+                "original_file_base64": file_to_base64(uploaded_file),
+                "original_resume_text": resume_text,
+                "generated_resume": optimized_text,
+                "generated_cover_letter": cover_letter_text
+            }
+
+            save_transaction_async(transaction_data, blob_data)
+            
+            # Save to session state to prevent reload loss
+            st.session_state.generated = {
+                "original_stats": original_analysis,
+                "new_stats": new_analysis,
+                "optimized_resume": optimized_text,
+                "cover_letter": cover_letter_text
+            }
+            
+            status.update(label="Complete!", state="complete", expanded=False)
+
+    # --- RESULTS DISPLAY ---
+    if st.session_state.generated:
+        res = st.session_state.generated
+        
+        st.divider()
+        
+        # Scoreboard
+        c1, c2, c3 = st.columns(3)
+        with c1:
+            st.metric("Original Score", f"{res['original_stats'].match_score}%")
+        with c2:
+            st.metric("Optimized Score", f"{res['new_stats'].match_score}%",
+                     delta=res['new_stats'].match_score - res['original_stats'].match_score)
+        with c3:
+            st.info(f"**Top Tip:** {(res['original_stats'].tips or [''])[0]}")
+
+        # Downloads & Previews
+        tab1, tab2 = st.tabs(["📄 Optimized Resume", "✉️ Cover Letter"])
+        
+        with tab1:
+            col_d1, col_d2 = st.columns([1, 4])
+            with col_d1:
+                st.download_button(
+                    "Download .docx",
+                    data=create_docx_cached(res['optimized_resume']),
+                    file_name="Optimized_Resume.docx",
+                    mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+                )
+            with col_d2:
+                st.markdown(res['optimized_resume'])
+                
+        with tab2:
+            col_d1, col_d2 = st.columns([1, 4])
+            with col_d1:
+                st.download_button(
+                    "Download .docx",
+                    data=create_docx_cached(res['cover_letter']),
+                    file_name="Cover_Letter.docx",
+                    mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+                )
+            with col_d2:
+                st.markdown(res['cover_letter'])
+
+def admin_page():
+    st.header("🔒 Admin Dashboard")
+    
+    # Simple password check against secrets
+    try:
+        admin_pass = st.secrets["ADMIN_PASSWORD"]
+    except:
+        st.error("ADMIN_PASSWORD not set in secrets.")
+        return
+
+    pwd_input = st.text_input("Enter Admin Password", type="password")
+    
+    if pwd_input == admin_pass:
+        # Read-only health check; doesn't hit the collection-create path
+        if not ping_db_cached():
+            st.error("Astra DB is not reachable. Transaction history is unavailable.")
+            return
+
+        if st.button("Refresh Data"):
+            fetch_transactions_cached.clear()
+            ping_db_cached.clear()
+            st.rerun()
+
+        transactions = fetch_transactions_cached()
+        
+        if not transactions:
+            st.info("No transactions found in DB.")
+            return
+            
+        # Summary Table — from_records with explicit columns only
+        # materializes the five displayed fields instead of every key of
+        # every document.
+        df = pd.DataFrame.from_records(
+            transactions,
+            columns=['timestamp', 'job_title', 'original_score', 'optimized_score', 'original_filename']
+        )
+        st.dataframe(df, use_container_width=True, hide_index=True)
+
+        st.divider()
+
+        # Detailed View — the options map holds only the _id per row; the
+        # full document is fetched on selection.
+        tx_options = {f"{t['timestamp']} - {t['job_title']}": t.get('_id') for t in transactions}
+        selected_tx_key = st.selectbox("Select Transaction Details", list(tx_options.keys()))
+
+        if selected_tx_key:
+            # Pull the full document (and its text bodies) only for the
+            # selected transaction. Pre-blob documents carry the bodies
+            # inline, so the blob merge is a no-op for them.
+            tx = fetch_transaction_detail(tx_options[selected_tx_key])
+            if not tx:
+                st.warning("Could not load transaction details.")
+                return
+            blob = fetch_blob(tx.get('blob_id'))
+            if blob:
+                tx = {**tx, **blob}
+
+            c1, c2, c3 = st.columns(3)
+            c1.metric("Original", f"{tx.get('original_score')}%")
+            c2.metric("Optimized", f"{tx.get('optimized_score')}%")
+            
+            # Downloads
+            d1, d2, d3 = st.columns(3)
+            
+            # Original File Download
+            if tx.get('original_file_base64'):
+                try:
+                    file_bytes = base64_to_bytes(tx['original_file_base64'])
+                    d1.download_button("⬇️ Original File", file_bytes, tx.get('original_filename', 'resume'))
+                except:
+                    d1.error("File corrupted")
+            
+            d2.download_button("⬇️ Optimized Resume", create_docx_cached(tx.get('generated_resume', '')), "Optimized.docx")
+            d3.download_button("⬇️ Cover Letter", create_docx_cached(tx.get('generated_cover_letter', '')), "CoverLetter.docx")
+
+            with st.expander("View Job Description"):
+                st.text(tx.get('job_description'))
+                
+            with st.expander("View Improvements Made"):
+                st.write(tx.get('improvements'))
+
+# --- 5. MAIN APP ROUTER ---
+
+def main():
+    # Sidebar Navigation
+    st.sidebar.title("Navigation")
+    page = st.sidebar.radio("Go to", ["Generator", "Admin Dashboard"])
+    
+    if page == "Generator":
+        generator_page()
+    else:
+        admin_page()
+
+if __name__ == "__main__":
+    main()